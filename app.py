@@ -3,29 +3,78 @@
 Flask Web Application for IoT Smart Robot Car
 Milestone 3 - Champlain College Saint-Lambert
 """
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, Response
+from flask.json.provider import DefaultJSONProvider
+import orjson
+from cachetools import TLRUCache
 import os
 import json
 from pathlib import Path
-from datetime import datetime
-import sqlite3
+from datetime import date, datetime, timedelta
 import requests
-from threading import Thread
+import httpx
+import asyncio
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread, Lock
+from collections import deque, OrderedDict
+from array import array
+import numpy as np
 import time
+import sched
 import sys
+import hashlib
+import base64
+import queue
+import random
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener
+
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY
+
+def _dump_json_bytes(obj):
+    """Encode obj as compact JSON bytes with orjson"""
+    return orjson.dumps(obj, default=DefaultJSONProvider.default, option=ORJSON_OPTIONS)
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson (used by jsonify and request.json)"""
+
+    def dumps(self, obj, **kwargs):
+        return _dump_json_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+# Log records go through a queue; a listener thread does the stderr writes off the request path
+_log_queue = queue.Queue(-1)
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter("[%(asctime)s] %(levelname)s in %(module)s: %(message)s"))
+_log_listener = QueueListener(_log_queue, _log_handler)
+logging.getLogger().addHandler(QueueHandler(_log_queue))
+logging.getLogger().setLevel(logging.INFO)
+# httpx/httpcore log every request at INFO; keep the 2s feed polling out of the log
+logging.getLogger("httpx").setLevel(logging.WARNING)
+logging.getLogger("httpcore").setLevel(logging.WARNING)
+_log_listener.start()
+atexit.register(_log_listener.stop)
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 
 # Configuration paths
 BASE_DIR = Path(__file__).parent
 sys.path.insert(0, str(BASE_DIR / "src"))
 from database_sync import (
-    save_to_local_db,
+    save_batch_to_local_db,
     sync_to_cloud,
     check_internet,
     init_local_db,
-    get_cloud_connection
+    get_local_connection,
+    get_cloud_connection,
+    release_cloud_connection
 )
 CONFIG_DIR = BASE_DIR / "config"
 DATA_DIR = BASE_DIR / "data"
@@ -54,7 +103,7 @@ if not AIO_USERNAME or not AIO_KEY:
             if not AIO_FEEDS_JSON or AIO_FEEDS_JSON == "{}":
                 AIO_FEEDS_JSON = json.dumps(ADAFRUIT_CONFIG.get("feeds", {}))
     except Exception as e:
-        print(f"Warning: Could not load Adafruit config file: {e}")
+        app.logger.warning(f"Could not load Adafruit config file: {e}")
 
 # Parse feeds from JSON string (env var) or dict (config file)
 try:
@@ -65,6 +114,83 @@ try:
 except Exception:
     AIO_FEEDS = {}
 
+AIO_ENABLED = bool(AIO_USERNAME and AIO_KEY)
+
+# Shared keep-alive HTTP session for Adafruit IO commands
+_aio_session = requests.Session()
+_aio_session.headers.update({"X-AIO-Key": AIO_KEY})
+_aio_session.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+))
+
+# Feed reads run on a dedicated event loop; the async client multiplexes them over one HTTP/2 connection
+_aio_loop = None
+_aio_loop_lock = Lock()
+_aio_client = None
+
+# Latest feed values. Each feed is reused for a TTL learned from how often it changes,
+# starting at ADAFRUIT_CACHE_TTL until a change interval has been observed.
+ADAFRUIT_CACHE_TTL = 10
+ADAFRUIT_TTL_MIN = 2
+ADAFRUIT_TTL_MAX = 60
+ADAFRUIT_TTL_EMA_ALPHA = 0.2
+ADAFRUIT_RATE_LIMIT_BACKOFF = 60  # seconds without feed reads (and doubled TTLs) after a 429
+ADAFRUIT_CACHE_MAX_FEEDS = 64
+ADAFRUIT_RETRY_MIN = 2  # seconds before re-reading a feed after its first failure, doubling per failure
+ADAFRUIT_RETRY_MAX = 60
+
+# Feeds that returned 404 are cached as _NEG so they are not re-requested every call
+_NEG = object()
+_MISS = object()
+# Bounded LRU whose entries expire after their feed's TTL at insertion time
+_adafruit_cache = TLRUCache(
+    maxsize=ADAFRUIT_CACHE_MAX_FEEDS,
+    ttu=lambda feed_key, value, now: now + get_feed_ttl(feed_key),
+    timer=time.time
+)
+_feed_last_value = {}
+_feed_interval_ema = {}
+_feed_last_change = {}
+_rate_limited_until = 0
+# A feed whose read failed (5xx, other errors or network error) is not re-requested before this time
+_feed_next_attempt = {}
+_feed_failures = {}
+_adafruit_lock = Lock()
+
+# Live-data snapshot kept current by the background poller and served by /api/live-data
+ADAFRUIT_POLL_INTERVAL = 1  # seconds
+LIVE_FEED_KEYS = ("ultrasonic_cm", "ir_left", "ir_center", "ir_right", "line_state",
+                  "camera_motion")  # Sensor 3: Camera motion detection
+_live_data = {}
+_live_payload = b""  # _live_data encoded once per change
+_live_etag = ""
+_last_poll_ok = None  # time of the last poll where every configured feed answered
+
+# Latest camera thumbnail, served separately by /api/camera-motion
+_camera_jpeg = None
+_camera_etag = ""
+_camera_version = 0
+
+# STOP commands that hit a retryable failure are retried by a worker thread
+# with jittered exponential backoff
+STOP_RETRY_ATTEMPTS = 3
+STOP_RETRY_MAX_DELAY = 8  # seconds
+_stop_queue = queue.Queue()
+_stop_lock = Lock()
+_stop_worker_started = False
+
+# Encoded /api/historical-data responses: key -> (expires_at, json_bytes, etag, cache_control)
+HIST_CACHE_TTL_TODAY = 30  # seconds, today's data keeps growing
+HIST_CACHE_TTL_PAST = 3600  # seconds, past dates no longer change
+HIST_BROWSER_CACHE_TODAY = 'max-age=30, must-revalidate'
+HIST_BROWSER_CACHE_PAST = 'public, max-age=86400, immutable'
+HIST_CACHE_MAX_ENTRIES = 50
+HIST_STREAM_ITERSIZE = 5000  # rows per round trip when streaming all cloud data
+_hist_cache = OrderedDict()
+_hist_cache_lock = Lock()
+
 # Database paths
 LOCAL_DB = DB_DIR / "robot_telemetry.db"
 SYNC_STATUS_FILE = DB_DIR / "sync_status.json"
@@ -75,134 +201,444 @@ CLOUD_DB_URL = os.environ.get("DATABASE_URL", "")  # Set in Render.com environme
 # Initialize local database (use function from database_sync module)
 init_local_db()
 
+# Sensor rows waiting to be written to the local DB in one batch
+LOCAL_FLUSH_INTERVAL = 5  # seconds
+LOCAL_FLUSH_MAX_ROWS = 500
+LOCAL_PENDING_MAX_ROWS = 10000  # oldest rows are dropped beyond this while the DB is failing
+CLOUD_SYNC_INTERVAL = 300  # seconds
+
+# Single scheduler thread for all periodic background work
+_sched = sched.scheduler(time.time, time.sleep)
+_sched_lock = Lock()
+_sched_started = False
+_poller_started = False
+_cloud_sync_started = False
+
+# Cloud syncs run one at a time off the scheduler thread
+_sync_pool = ThreadPoolExecutor(max_workers=1)
+_sync_future = None
+_pending_rows = deque()
+_pending_lock = Lock()
+
 # ============================================================================
 # Database Functions
 # ============================================================================
 
-def get_historical_data(date_str=None):
+# Historical queries, ordered oldest first; LIMIT NULL (PostgreSQL) / -1 (SQLite) means no limit
+CLOUD_HIST_SQL_DATE = '''
+    SELECT timestamp, ultrasonic_cm, ir_left, ir_center, ir_right, line_state
+    FROM sensor_data
+    WHERE DATE(timestamp) = %s
+    ORDER BY timestamp ASC
+    LIMIT %s OFFSET %s
+'''
+CLOUD_HIST_SQL_ALL = '''
+    SELECT timestamp, ultrasonic_cm, ir_left, ir_center, ir_right, line_state
+    FROM sensor_data
+    ORDER BY timestamp ASC
+    LIMIT %s OFFSET %s
+'''
+HIST_SQL_DATE = '''
+    SELECT timestamp, ultrasonic_cm, ir_left, ir_center, ir_right, line_state
+    FROM sensor_data
+    WHERE date(timestamp) = date(?)
+    ORDER BY timestamp
+    LIMIT ? OFFSET ?
+'''
+HIST_SQL_ALL = '''
+    SELECT timestamp, ultrasonic_cm, ir_left, ir_center, ir_right, line_state
+    FROM sensor_data
+    ORDER BY timestamp
+    LIMIT ? OFFSET ?
+'''
+
+_NAN = float("nan")
+
+def _records_to_columns(records):
+    """Build per-sensor columns (structure of arrays) in a single pass over the rows
+    Numeric columns are float64 arrays with NaN for missing values, which orjson encodes as null
+    """
+    timestamps, line_state = [], []
+    ultrasonic, ir_left, ir_center, ir_right = array('d'), array('d'), array('d'), array('d')
+    for r in records:
+        timestamps.append(r[0])
+        ultrasonic.append(_NAN if r[1] is None else r[1])
+        ir_left.append(_NAN if r[2] is None else r[2])
+        ir_center.append(_NAN if r[3] is None else r[3])
+        ir_right.append(_NAN if r[4] is None else r[4])
+        line_state.append(r[5] or "")
+    return {
+        "timestamps": timestamps,
+        "ultrasonic": np.frombuffer(ultrasonic, dtype=np.float64),
+        "ir_left": np.frombuffer(ir_left, dtype=np.float64),
+        "ir_center": np.frombuffer(ir_center, dtype=np.float64),
+        "ir_right": np.frombuffer(ir_right, dtype=np.float64),
+        "line_state": line_state
+    }
+
+def get_historical_data(date_str=None, limit=None, offset=0):
     """Get historical data from cloud DB (Neon.com) or local DB fallback
     If date_str is None, returns ALL historical data
     If date_str is provided, returns data for that specific date only
+    limit/offset page through the rows in timestamp order (limit=None means no limit)
+    Returns (columns, source): a dict of per-sensor column lists and "cloud" or "local"
     """
     # Try cloud database first (for Render.com deployment)
     if CLOUD_DB_URL:
         conn, error = get_cloud_connection()
         if conn:
             try:
-                from psycopg2.extras import RealDictCursor
-                c = conn.cursor(cursor_factory=RealDictCursor)
-
                 # Query by date if provided, otherwise get all data
                 if date_str:
+                    c = conn.cursor()
                     # Support both date formats: YYYY-MM-DD and full datetime
-                    c.execute('''
-                        SELECT timestamp, ultrasonic_cm, ir_left, ir_center, ir_right, line_state
-                        FROM sensor_data
-                        WHERE DATE(timestamp) = %s
-                        ORDER BY timestamp ASC
-                    ''', (date_str,))
+                    c.execute(CLOUD_HIST_SQL_DATE, (date_str, limit, offset))
                 else:
-                    # Get ALL historical data (most recent first, or oldest first?)
-                    # Using ASC to show chronological order
-                    c.execute('''
-                        SELECT timestamp, ultrasonic_cm, ir_left, ir_center, ir_right, line_state
-                        FROM sensor_data
-                        ORDER BY timestamp ASC
-                    ''')
-
-                records = c.fetchall()
-                conn.close()
-                print(f"[app] Retrieved {len(records)} records from cloud DB (date: {date_str or 'ALL'})", file=sys.stderr)
-                # Convert to list of tuples for compatibility
-                result = [(r['timestamp'], r['ultrasonic_cm'], r['ir_left'], r['ir_center'], r['ir_right'], r['line_state'])
-                        for r in records]
-                if len(result) == 0:
-                    print(f"[app] WARNING: No records found in cloud DB for date: {date_str or 'ALL'}", file=sys.stderr)
-                return result
+                    # Get ALL historical data, oldest first to show chronological order
+                    # Server-side cursor streams the rows in batches instead of buffering the whole table
+                    c = conn.cursor('hist_stream')
+                    c.itersize = HIST_STREAM_ITERSIZE
+                    c.execute(CLOUD_HIST_SQL_ALL, (limit, offset))
+
+                data = _records_to_columns(c)
+                c.close()
+                release_cloud_connection(conn)
+                count = len(data["timestamps"])
+                app.logger.debug(f"Retrieved {count} records from cloud DB (date: {date_str or 'ALL'})")
+                if count == 0:
+                    app.logger.debug(f"No records found in cloud DB for date: {date_str or 'ALL'}")
+                return data, "cloud"
             except Exception as e:
-                print(f"[app] ERROR getting historical data from cloud DB: {e}", file=sys.stderr)
-                import traceback
-                print(f"[app] Traceback: {traceback.format_exc()}", file=sys.stderr)
-                try:
-                    conn.close()
-                except:
-                    pass
+                app.logger.exception(f"Error getting historical data from cloud DB: {e}")
+                release_cloud_connection(conn, close=True)
                 # Fall through to local DB
         else:
-            print(f"[app] Could not connect to cloud DB: {error}", file=sys.stderr)
+            app.logger.warning(f"Could not connect to cloud DB: {error}")
 
     # Fallback to local DB (for local development or if cloud fails)
+    sqlite_limit = -1 if limit is None else limit
     try:
-        conn = sqlite3.connect(LOCAL_DB)
-        c = conn.cursor()
-
+        conn = get_local_connection()
         if date_str:
-            c.execute('''
-                SELECT timestamp, ultrasonic_cm, ir_left, ir_center, ir_right, line_state
-                FROM sensor_data
-                WHERE date(timestamp) = date(?)
-                ORDER BY timestamp
-            ''', (date_str,))
+            c = conn.execute(HIST_SQL_DATE, (date_str, sqlite_limit, offset))
         else:
             # Get ALL historical data
-            c.execute('''
-                SELECT timestamp, ultrasonic_cm, ir_left, ir_center, ir_right, line_state
-                FROM sensor_data
-                ORDER BY timestamp
-            ''')
-
-        records = c.fetchall()
-        conn.close()
-        print(f"[app] Retrieved {len(records)} records from local DB (date: {date_str or 'ALL'})")
-        return records
+            c = conn.execute(HIST_SQL_ALL, (sqlite_limit, offset))
+
+        data = _records_to_columns(c)
+        app.logger.debug(f"Retrieved {len(data['timestamps'])} records from local DB (date: {date_str or 'ALL'})")
+        return data, "local"
     except Exception as e:
-        print(f"[app] Error getting historical data from local DB: {e}", file=sys.stderr)
-        return []
+        app.logger.error(f"Error getting historical data from local DB: {e}")
+        return _records_to_columns([]), "local"
+
+def queue_local_row(row):
+    """Queue a sensor row for the next batched local DB write
+    Row is (timestamp, ultrasonic, ir_left, ir_center, ir_right, line_state)
+    """
+    with _pending_lock:
+        _pending_rows.append(row)
+        backlog = len(_pending_rows)
+    # Flush inline if the sync worker is not draining the queue fast enough
+    # (once per full batch, so a failing DB is not retried on every new row)
+    if backlog % LOCAL_FLUSH_MAX_ROWS == 0:
+        flush_local_rows()
+
+def flush_local_rows():
+    """Write queued sensor rows to the local DB, up to LOCAL_FLUSH_MAX_ROWS per transaction"""
+    while True:
+        with _pending_lock:
+            count = min(len(_pending_rows), LOCAL_FLUSH_MAX_ROWS)
+            rows = [_pending_rows.popleft() for _ in range(count)]
+        if not rows:
+            return
+        if not save_batch_to_local_db(rows):
+            # Put rows back so they are retried on the next flush
+            with _pending_lock:
+                _pending_rows.extendleft(reversed(rows))
+                dropped = len(_pending_rows) - LOCAL_PENDING_MAX_ROWS
+                for _ in range(max(0, dropped)):
+                    _pending_rows.popleft()
+            if dropped > 0:
+                app.logger.warning(f"Local DB unavailable, dropped {dropped} oldest queued rows")
+            return
+
+# Write whatever is still queued when the process exits (restart/deploy)
+atexit.register(flush_local_rows)
 
 # ============================================================================
 # Adafruit IO Functions
 # ============================================================================
 
-def get_adafruit_data(feed_key):
-    """Get latest value from Adafruit IO feed via HTTP"""
-    if not AIO_USERNAME or not AIO_KEY:
+def get_feed_ttl(feed_key):
+    """Cache TTL for feed_key: half its average change interval, doubled while rate limited"""
+    ema = _feed_interval_ema.get(feed_key)
+    if ema is None:
+        ttl = ADAFRUIT_CACHE_TTL
+    else:
+        ttl = max(ADAFRUIT_TTL_MIN, min(ADAFRUIT_TTL_MAX, 0.5 * ema))
+    if time.time() < _rate_limited_until:
+        ttl *= 2
+    return ttl
+
+def _store_adafruit_value(feed_key, value):
+    """Cache a fetched feed value and update the feed's change-interval EMA"""
+    with _adafruit_lock:
+        _store_adafruit_value_locked(feed_key, value)
+
+def _store_adafruit_value_locked(feed_key, value):
+    now = time.time()
+    previous = _feed_last_value.get(feed_key, _MISS)
+    if previous is not _MISS and previous != value:
+        last_change = _feed_last_change.get(feed_key)
+        if last_change is not None:
+            interval = now - last_change
+            ema = _feed_interval_ema.get(feed_key)
+            _feed_interval_ema[feed_key] = interval if ema is None else (
+                ADAFRUIT_TTL_EMA_ALPHA * interval + (1 - ADAFRUIT_TTL_EMA_ALPHA) * ema)
+        _feed_last_change[feed_key] = now
+    elif previous is _MISS:
+        _feed_last_change[feed_key] = now
+    _feed_last_value[feed_key] = value
+    # Set after the EMA update so the entry's expiry uses the new TTL
+    _adafruit_cache[feed_key] = value
+
+def get_cached_adafruit_data(feed_key):
+    """Return (True, value) if feed_key has a fresh cached value, else (False, None)"""
+    with _adafruit_lock:
+        value = _adafruit_cache.get(feed_key, _MISS)
+    if value is _MISS:
+        return False, None
+    return True, None if value is _NEG else value
+
+def get_last_adafruit_value(feed_key):
+    """Last value fetched for feed_key regardless of TTL (None if never fetched or 404)"""
+    with _adafruit_lock:
+        value = _feed_last_value.get(feed_key)
+    return None if value is _NEG else value
+
+def _schedule_feed_retry(feed_key, now):
+    """Back off re-reading a failed feed exponentially, from ADAFRUIT_RETRY_MIN up to ADAFRUIT_RETRY_MAX"""
+    failures = _feed_failures.get(feed_key, 0)
+    _feed_failures[feed_key] = failures + 1
+    _feed_next_attempt[feed_key] = now + min(ADAFRUIT_RETRY_MAX, ADAFRUIT_RETRY_MIN * 2 ** failures)
+
+def feed_backing_off(feed_key):
+    """True while feed_key must not be read from Adafruit IO (rate limited or retry pending)"""
+    now = time.time()
+    return now < _rate_limited_until or now < _feed_next_attempt.get(feed_key, 0)
+
+def _run_async(coro):
+    """Run coro on the shared Adafruit IO event loop and wait for its result"""
+    global _aio_loop
+    with _aio_loop_lock:
+        if _aio_loop is None:
+            _aio_loop = asyncio.new_event_loop()
+            Thread(target=_aio_loop.run_forever, daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coro, _aio_loop).result()
+
+def _get_async_client():
+    # Only called on the event loop thread, so no lock needed
+    global _aio_client
+    if _aio_client is None:
+        _aio_client = httpx.AsyncClient(http2=True, timeout=5.0, headers={"X-AIO-Key": AIO_KEY})
+    return _aio_client
+
+def _decode_jpeg(value):
+    """Decode a base64 camera thumbnail (optionally a data: URI) to JPEG bytes"""
+    if value.startswith("data:"):
+        value = value.split(",", 1)[-1]
+    return base64.b64decode(value)
+
+# Feed values arrive as strings; they are cast once on fetch and cached typed
+_FEED_TYPES = {
+    "ultrasonic_cm": float,
+    "ir_left": int,
+    "ir_center": int,
+    "ir_right": int,
+    "line_state": str,
+    "camera_motion": _decode_jpeg,
+}
+
+def _cast_feed_value(feed_key, value, caster):
+    """Cast a raw feed value, returning None for empty or malformed values"""
+    if value is None or value == "":
         return None
+    try:
+        if caster is int:
+            # IR feeds may be published as "1" or "1.0"
+            return int(float(value))
+        return caster(value)
+    except (TypeError, ValueError):
+        app.logger.warning(f"Ignoring malformed value for feed '{feed_key}': {value!r}")
+        return None
+
+async def get_adafruit_data(feed_key, caster=None):
+    """Get latest value from Adafruit IO feed via HTTP, cast with caster
+    (defaults to the feed's type in _FEED_TYPES, else str)
+    """
+    global _rate_limited_until
+    if not AIO_ENABLED:
+        return None
+    hit, value = get_cached_adafruit_data(feed_key)
+    if hit:
+        return value
+    # Backing off: serve the last value instead of hitting Adafruit IO again
+    if feed_backing_off(feed_key):
+        return get_last_adafruit_value(feed_key)
+    now = time.time()
     try:
         feed_name = AIO_FEEDS.get(feed_key, "")
         if not feed_name:
             return None
         url = f"https://io.adafruit.com/api/v2/{AIO_USERNAME}/feeds/{feed_name}/data/last"
-        headers = {"X-AIO-Key": AIO_KEY}
-        response = requests.get(url, headers=headers, timeout=5)
+        response = await _get_async_client().get(url)
         if response.status_code == 200:
             data = response.json()
-            return data.get("value")
-        return None
+            value = _cast_feed_value(feed_key, data.get("value"), caster or _FEED_TYPES.get(feed_key, str))
+            _feed_next_attempt.pop(feed_key, None)
+            _feed_failures.pop(feed_key, None)
+            _store_adafruit_value(feed_key, value)
+            return value
+        if response.status_code == 404:
+            _store_adafruit_value(feed_key, _NEG)
+            return None
+        if response.status_code == 429:
+            _rate_limited_until = now + ADAFRUIT_RATE_LIMIT_BACKOFF
+        else:
+            _schedule_feed_retry(feed_key, now)
     except Exception as e:
-        print(f"Error fetching Adafruit data: {e}")
-        return None
-
-def send_adafruit_command(feed_key, value):
-    """Send command to Adafruit IO feed"""
-    if not AIO_USERNAME or not AIO_KEY:
-        return False
+        app.logger.error(f"Error fetching Adafruit data: {e}")
+        _schedule_feed_retry(feed_key, now)
+    return get_last_adafruit_value(feed_key)
+
+# Outcomes of posting a command to Adafruit IO
+COMMAND_OK = "ok"
+COMMAND_RETRY = "retry"  # network error, 429 or 5xx - may succeed later
+COMMAND_FAILED = "failed"  # disabled, unknown feed or other 4xx - retrying will not help
+
+def post_adafruit_command(feed_key, value):
+    """Send command to Adafruit IO feed, returning COMMAND_OK, COMMAND_RETRY or COMMAND_FAILED"""
+    if not AIO_ENABLED:
+        return COMMAND_FAILED
     try:
         feed_name = AIO_FEEDS.get(feed_key, "")
         if not feed_name:
-            print(f"Feed key '{feed_key}' not found in AIO_FEEDS")
-            return False
+            app.logger.warning(f"Feed key '{feed_key}' not found in AIO_FEEDS")
+            return COMMAND_FAILED
         url = f"https://io.adafruit.com/api/v2/{AIO_USERNAME}/feeds/{feed_name}/data"
-        headers = {"X-AIO-Key": AIO_KEY, "Content-Type": "application/json"}
         data = {"value": str(value)}
-        response = requests.post(url, headers=headers, json=data, timeout=5)
+        response = _aio_session.post(url, json=data, timeout=5)
         # Accept both 200 (OK) and 201 (Created) as success
-        success = response.status_code in [200, 201]
-        if not success:
-            print(f"Adafruit IO returned status {response.status_code}: {response.text}")
-        return success
+        if response.status_code in [200, 201]:
+            return COMMAND_OK
+        app.logger.warning(f"Adafruit IO returned status {response.status_code}: {response.text}")
+        if response.status_code == 429 or response.status_code >= 500:
+            return COMMAND_RETRY
+        return COMMAND_FAILED
     except Exception as e:
-        print(f"Error sending Adafruit command: {e}")
-        return False
+        app.logger.error(f"Error sending Adafruit command: {e}")
+        return COMMAND_RETRY
+
+def send_adafruit_command(feed_key, value):
+    """Send command to Adafruit IO feed"""
+    return post_adafruit_command(feed_key, value) == COMMAND_OK
+
+def _stop_command_worker():
+    """Retry queued STOP commands whose first (inline) attempt hit a retryable failure"""
+    while True:
+        feed_key, value = _stop_queue.get()
+        result = COMMAND_RETRY
+        for attempt in range(STOP_RETRY_ATTEMPTS - 1):
+            time.sleep(min(STOP_RETRY_MAX_DELAY, 0.5 * 2 ** attempt + random.random() * 0.3))
+            result = post_adafruit_command(feed_key, value)
+            if result != COMMAND_RETRY:
+                break
+        if result != COMMAND_OK:
+            app.logger.error(f"Giving up sending {value} to '{feed_key}' after {attempt + 2} attempts")
+        _stop_queue.task_done()
+
+def queue_stop_command(feed_key, value="stop"):
+    """Queue a STOP command for background retries (worker started on first use)"""
+    global _stop_worker_started
+    with _stop_lock:
+        if not _stop_worker_started:
+            _stop_worker_started = True
+            Thread(target=_stop_command_worker, daemon=True).start()
+    _stop_queue.put((feed_key, value))
+
+def send_stop_command(feed_key):
+    """Send STOP now; on a retryable failure queue background retries
+    Returns the JSON response for the stop routes. success is only true once
+    Adafruit IO accepted the command, so the page never reports an undelivered STOP.
+    """
+    result = post_adafruit_command(feed_key, "stop")
+    if result == COMMAND_RETRY:
+        queue_stop_command(feed_key)
+        return jsonify({"success": False, "queued": True}), 202
+    return jsonify({"success": result == COMMAND_OK})
+
+async def _fetch_adafruit_feeds(feed_keys):
+    return await asyncio.gather(*(get_adafruit_data(k) for k in feed_keys))
+
+def refresh_live_data():
+    """Refresh stale feeds in parallel and update the live-data snapshot
+    A new snapshot is only produced when a feed value changed, and a local DB row only
+    when a sensor value (not just the camera image) changed.
+    """
+    global _live_data, _live_payload, _live_etag, _camera_jpeg, _camera_etag, _camera_version
+    global _last_poll_ok
+    values = {}
+    stale = []
+    for k in LIVE_FEED_KEYS:
+        hit, value = get_cached_adafruit_data(k)
+        if hit:
+            values[k] = value
+        elif feed_backing_off(k):
+            # Failed recently; keep the last value until its retry is due
+            values[k] = get_last_adafruit_value(k)
+        else:
+            stale.append(k)
+    if stale:
+        values.update(zip(stale, _run_async(_fetch_adafruit_feeds(stale))))
+    # A successful fetch always populates the cache, so any configured feed still missing
+    # failed or is backing off
+    if AIO_ENABLED and all(get_cached_adafruit_data(k)[0] for k in LIVE_FEED_KEYS if k in AIO_FEEDS):
+        _last_poll_ok = datetime.now().isoformat()
+
+    camera_jpeg = values.pop("camera_motion")
+    with _adafruit_lock:
+        camera_changed = camera_jpeg != _camera_jpeg
+        sensors_changed = not _live_data or any(_live_data[k] != v for k, v in values.items())
+        if not sensors_changed and not camera_changed:
+            return _live_data
+        if camera_changed:
+            _camera_jpeg = camera_jpeg
+            _camera_etag = hashlib.md5(camera_jpeg).hexdigest() if camera_jpeg else ""
+            _camera_version += 1
+        timestamp = datetime.now().isoformat()
+        _live_data = {
+            **values,
+            # Clients reload /api/camera-motion when this changes
+            "camera_motion_version": _camera_version if _camera_jpeg else None,
+            "timestamp": timestamp
+        }
+        _live_payload = _dump_json_bytes(_live_data)
+        _live_etag = hashlib.blake2b(_live_payload, digest_size=8).hexdigest()
+        snapshot = _live_data
+
+    # Queue for local database (for offline storage) - only if we have data
+    row = (
+        timestamp,
+        values["ultrasonic_cm"],
+        values["ir_left"],
+        values["ir_center"],
+        values["ir_right"],
+        values["line_state"]
+    )
+    if sensors_changed and any(v is not None for v in row[1:]):
+        queue_local_row(row)
+    return snapshot
 
 # ============================================================================
 # Routes
@@ -246,39 +682,46 @@ def obstacle_avoidance():
 def api_live_data():
     """Get live sensor data from Adafruit IO"""
     try:
-        ultrasonic = get_adafruit_data("ultrasonic_cm")
-        ir_left = get_adafruit_data("ir_left")
-        ir_center = get_adafruit_data("ir_center")
-        ir_right = get_adafruit_data("ir_right")
-        line_state = get_adafruit_data("line_state")
-        camera_motion = get_adafruit_data("camera_motion")  # Sensor 3: Camera motion detection
-        timestamp = datetime.now().isoformat()
+        # Served from the poller's snapshot; no Adafruit IO requests on the request path
+        start_adafruit_poller()
+        with _adafruit_lock:
+            has_data = bool(_live_data)
+        if not has_data:
+            refresh_live_data()
+        with _adafruit_lock:
+            payload, etag = _live_payload, _live_etag
+
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(payload, mimetype='application/json')
+        response.set_etag(etag)
+        # Let browsers keep the body but revalidate on every poll
+        response.headers['Cache-Control'] = 'no-cache'
+        # Kept out of the body so the ETag only changes with the sensor values
+        if _last_poll_ok:
+            response.headers['X-Last-Poll'] = _last_poll_ok
+        return response
+    except Exception as e:
+        app.logger.error(f"Error in api_live_data: {e}")
+        return jsonify({"error": "Internal server error"}), 500
 
-        # Save to local database (for offline storage) - only if we have data
-        try:
-            save_to_local_db(
-                timestamp=timestamp,
-                ultrasonic=float(ultrasonic) if ultrasonic else None,
-                ir_left=int(ir_left) if ir_left else None,
-                ir_center=int(ir_center) if ir_center else None,
-                ir_right=int(ir_right) if ir_right else None,
-                line_state=line_state if line_state else None
-            )
-        except Exception as e:
-            print(f"Warning: Could not save to local DB: {e}")
-
-        data = {
-            "ultrasonic_cm": ultrasonic,
-            "ir_left": ir_left,
-            "ir_center": ir_center,
-            "ir_right": ir_right,
-            "line_state": line_state,
-            "camera_motion": camera_motion,  # Sensor 3: Camera thumbnail (base64 image)
-            "timestamp": timestamp
-        }
-        return jsonify(data)
+@app.route('/api/camera-motion')
+def api_camera_motion():
+    """Get the latest camera thumbnail (Sensor 3) as a JPEG image"""
+    try:
+        start_adafruit_poller()
+        with _adafruit_lock:
+            jpeg, etag = _camera_jpeg, _camera_etag
+        if not jpeg:
+            return jsonify({"error": "No camera image available"}), 404
+
+        response = Response(jpeg, mimetype='image/jpeg')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
     except Exception as e:
-        print(f"Error in api_live_data: {e}")
+        app.logger.error(f"Error in api_camera_motion: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
 @app.route('/api/capture-photo', methods=['POST'])
@@ -289,82 +732,115 @@ def api_capture_photo():
         # This forces an immediate refresh of the image display
         return jsonify({"status": "success", "message": "Refreshing camera feed..."})
     except Exception as e:
-        print(f"Error in api_capture_photo: {e}")
+        app.logger.error(f"Error in api_capture_photo: {e}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
-@app.route('/api/historical-data', methods=['POST'])
-def api_historical_data():
-    """Get historical sensor data for a specific date (or all data if no date provided)"""
-    try:
-        if not request.json:
-            return jsonify({"error": "JSON body required"}), 400
-
-        date_str = request.json.get('date')  # Optional - if None, returns all data
-        records = get_historical_data(date_str)
-        data = {
-            "timestamps": [r[0] for r in records],
-            "ultrasonic": [r[1] if r[1] is not None else None for r in records],
-            "ir_left": [r[2] if r[2] is not None else None for r in records],
-            "ir_center": [r[3] if r[3] is not None else None for r in records],
-            "ir_right": [r[4] if r[4] is not None else None for r in records],
-            "line_state": [r[5] if r[5] else "" for r in records]
-        }
-        return jsonify(data)
-    except Exception as e:
-        print(f"Error in api_historical_data: {e}")
-        return jsonify({"error": "Internal server error"}), 500
+def _historical_response(payload, etag, cache_control):
+    response = Response(payload, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    # Answers If-None-Match with 304 (GET/HEAD only)
+    return response.make_conditional(request)
 
-@app.route('/api/control/motor', methods=['POST'])
-def api_control_motor():
-    """Control car motors"""
+@app.route('/api/historical-data', methods=['GET', 'POST'])
+def api_historical_data():
+    """Get historical sensor data for a specific date (or all data if no date provided)
+    GET takes date/limit/offset as query parameters and is cacheable by the browser;
+    POST takes them as a JSON body.
+    """
     try:
-        if not request.json:
-            return jsonify({"error": "JSON body required"}), 400
-
-        action = request.json.get('action')  # forward, backward, left, right, stop
-        if not isinstance(action, str) or action not in ['forward', 'backward', 'left', 'right', 'stop']:
-            return jsonify({"error": "Invalid action"}), 400
-
-        # Send command to Adafruit IO (which will be picked up by Raspberry Pi)
-        success = send_adafruit_command("motor_control", action)
-        return jsonify({"success": success, "action": action})
+        if request.method == 'GET':
+            params = request.args
+            try:
+                limit = int(params['limit']) if 'limit' in params else None
+                offset = int(params.get('offset', 0))
+            except ValueError:
+                return jsonify({"error": "Invalid limit or offset"}), 400
+        else:
+            if not request.json:
+                return jsonify({"error": "JSON body required"}), 400
+            params = request.json
+            limit = params.get('limit')  # Optional - page size, None for no limit
+            offset = params.get('offset', 0)  # Optional - rows to skip
+
+        date_str = params.get('date')  # Optional - if None, returns all data
+        if date_str is not None and not isinstance(date_str, str):
+            return jsonify({"error": "Invalid date"}), 400
+        day = None
+        if date_str:
+            # Only YYYY-MM-DD; normalized so equivalent spellings share a cache entry
+            try:
+                day = date.fromisoformat(date_str)
+            except ValueError:
+                return jsonify({"error": "Invalid date"}), 400
+            date_str = day.isoformat()
+        if limit is not None and (not isinstance(limit, int) or limit < 0):
+            return jsonify({"error": "Invalid limit"}), 400
+        if not isinstance(offset, int) or offset < 0:
+            return jsonify({"error": "Invalid offset"}), 400
+
+        key = (date_str or "ALL", limit, offset)
+        now = time.time()
+        with _hist_cache_lock:
+            cached = _hist_cache.get(key)
+            if cached and cached[0] > now:
+                _hist_cache.move_to_end(key)
+                return _historical_response(*cached[1:])
+
+        data, source = get_historical_data(date_str, limit=limit, offset=offset)
+        payload = _dump_json_bytes(data)
+        etag = hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+        # Only dates a full day old are immutable: the server clock (UTC on Render) can be a
+        # day off from the Pi's local dates. Local-fallback and empty results may be a cloud
+        # outage or still syncing, so keep them short
+        is_past = day is not None and day < date.today() - timedelta(days=1)
+        if is_past and source == "cloud" and data["timestamps"]:
+            ttl, cache_control = HIST_CACHE_TTL_PAST, HIST_BROWSER_CACHE_PAST
+        else:
+            ttl, cache_control = HIST_CACHE_TTL_TODAY, HIST_BROWSER_CACHE_TODAY
+        with _hist_cache_lock:
+            _hist_cache[key] = (now + ttl, payload, etag, cache_control)
+            _hist_cache.move_to_end(key)
+            while len(_hist_cache) > HIST_CACHE_MAX_ENTRIES:
+                _hist_cache.popitem(last=False)
+        return _historical_response(payload, etag, cache_control)
     except Exception as e:
-        print(f"Error in api_control_motor: {e}")
+        app.logger.error(f"Error in api_historical_data: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
-@app.route('/api/control/led', methods=['POST'])
-def api_control_led():
-    """Control LEDs"""
-    try:
-        if not request.json:
-            return jsonify({"error": "JSON body required"}), 400
-
-        state = request.json.get('state')  # on, off
-        if not isinstance(state, str) or state not in ['on', 'off']:
-            return jsonify({"error": "Invalid state"}), 400
+# Valid values for each control endpoint
+_MOTOR_ACTIONS = frozenset({'forward', 'backward', 'left', 'right', 'stop'})
+_SWITCH_STATES = frozenset({'on', 'off'})
 
-        success = send_adafruit_command("led_control", state)
-        return jsonify({"success": success, "state": state})
-    except Exception as e:
-        print(f"Error in api_control_led: {e}")
-        return jsonify({"error": "Internal server error"}), 500
-
-@app.route('/api/control/buzzer', methods=['POST'])
-def api_control_buzzer():
-    """Control buzzer"""
-    try:
-        if not request.json:
-            return jsonify({"error": "JSON body required"}), 400
+def _make_control_route(name, feed_key, field, valid_values):
+    """Build a POST handler that validates request.json[field] and sends it to feed_key"""
+    def handler():
+        try:
+            if not request.json:
+                return jsonify({"error": "JSON body required"}), 400
 
-        state = request.json.get('state')  # on, off
-        if not isinstance(state, str) or state not in ['on', 'off']:
-            return jsonify({"error": "Invalid state"}), 400
+            value = request.json.get(field)
+            if not isinstance(value, str) or value not in valid_values:
+                return jsonify({"error": f"Invalid {field}"}), 400
 
-        success = send_adafruit_command("buzzer_control", state)
-        return jsonify({"success": success, "state": state})
-    except Exception as e:
-        print(f"Error in api_control_buzzer: {e}")
-        return jsonify({"error": "Internal server error"}), 500
+            # Send command to Adafruit IO (which will be picked up by Raspberry Pi)
+            success = send_adafruit_command(feed_key, value)
+            return jsonify({"success": success, field: value})
+        except Exception as e:
+            app.logger.error(f"Error in {name}: {e}")
+            return jsonify({"error": "Internal server error"}), 500
+    handler.__name__ = name
+    return handler
+
+# rule -> (endpoint, feed key, JSON field, valid values)
+_CONTROL_ROUTES = {
+    '/api/control/motor': ("api_control_motor", "motor_control", "action", _MOTOR_ACTIONS),
+    '/api/control/led': ("api_control_led", "led_control", "state", _SWITCH_STATES),
+    '/api/control/buzzer': ("api_control_buzzer", "buzzer_control", "state", _SWITCH_STATES),
+}
+for _rule, (_name, _feed_key, _field, _valid) in _CONTROL_ROUTES.items():
+    app.add_url_rule(_rule, _name, _make_control_route(_name, _feed_key, _field, _valid), methods=['POST'])
 
 @app.route('/api/line-tracking/start', methods=['POST'])
 def api_line_tracking_start():
@@ -373,17 +849,16 @@ def api_line_tracking_start():
         success = send_adafruit_command("line_tracking", "start")
         return jsonify({"success": success})
     except Exception as e:
-        print(f"Error in api_line_tracking_start: {e}")
+        app.logger.error(f"Error in api_line_tracking_start: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
 @app.route('/api/line-tracking/stop', methods=['POST'])
 def api_line_tracking_stop():
     """Stop line tracking algorithm"""
     try:
-        success = send_adafruit_command("line_tracking", "stop")
-        return jsonify({"success": success})
+        return send_stop_command("line_tracking")
     except Exception as e:
-        print(f"Error in api_line_tracking_stop: {e}")
+        app.logger.error(f"Error in api_line_tracking_stop: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
 @app.route('/api/obstacle-avoidance/start', methods=['POST'])
@@ -393,29 +868,75 @@ def api_obstacle_avoidance_start():
         success = send_adafruit_command("obstacle_avoidance", "start")
         return jsonify({"success": success})
     except Exception as e:
-        print(f"Error in api_obstacle_avoidance_start: {e}")
+        app.logger.error(f"Error in api_obstacle_avoidance_start: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
 @app.route('/api/obstacle-avoidance/stop', methods=['POST'])
 def api_obstacle_avoidance_stop():
     """Stop obstacle avoidance algorithm"""
     try:
-        success = send_adafruit_command("obstacle_avoidance", "stop")
-        return jsonify({"success": success})
+        return send_stop_command("obstacle_avoidance")
     except Exception as e:
-        print(f"Error in api_obstacle_avoidance_stop: {e}")
+        app.logger.error(f"Error in api_obstacle_avoidance_stop: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
+def _schedule_every(interval, task):
+    """Run task now and then every interval seconds on the background scheduler"""
+    def run():
+        try:
+            task()
+        except Exception as e:
+            app.logger.error(f"Error in background task {task.__name__}: {e}")
+        _sched.enter(interval, 0, run)
+    _sched.enter(0, 0, run)
+
+def _cloud_sync():
+    if check_internet():
+        sync_to_cloud()
+
+def sync_tick():
+    """Start a cloud sync on the sync pool so slow network calls do not delay other tasks
+    Skipped while the previous sync is still running (sync_to_cloud is not reentrant).
+    """
+    global _sync_future
+    if _sync_future is not None and not _sync_future.done():
+        app.logger.warning("Previous cloud sync still running, skipping this tick")
+        return
+    _sync_future = _sync_pool.submit(_cloud_sync)
+
+def _start_scheduler_locked():
+    # Caller holds _sched_lock
+    global _sched_started
+    if not _sched_started:
+        _sched_started = True
+        thread = Thread(target=_sched.run, daemon=True)
+        thread.start()
+
+def start_adafruit_poller():
+    """Start the background Adafruit IO poller (once per process)
+    Polls Adafruit IO every second and flushes the rows it queues to the local DB
+    every 5 seconds. Called lazily by the live-data routes; does not sync to the cloud.
+    """
+    global _poller_started
+    with _sched_lock:
+        if _poller_started:
+            return
+        _poller_started = True
+        _schedule_every(ADAFRUIT_POLL_INTERVAL, refresh_live_data)
+        _schedule_every(LOCAL_FLUSH_INTERVAL, flush_local_rows)
+        _start_scheduler_locked()
+
 def start_sync_worker():
-    """Start background thread for database sync"""
-    def sync_loop():
-        while True:
-            if check_internet():
-                sync_to_cloud()
-            time.sleep(300)  # Sync every 5 minutes
-
-    thread = Thread(target=sync_loop, daemon=True)
-    thread.start()
+    """Start all background work (once per process)
+    Starts the Adafruit IO poller and syncs the local DB to the cloud every 5 minutes.
+    """
+    global _cloud_sync_started
+    start_adafruit_poller()
+    with _sched_lock:
+        if _cloud_sync_started:
+            return
+        _cloud_sync_started = True
+        _schedule_every(CLOUD_SYNC_INTERVAL, sync_tick)
 
 if __name__ == '__main__':
     # Start sync worker
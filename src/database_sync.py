@@ -8,9 +8,12 @@ import os
 import json
 import time
 import sys
+import threading
+import atexit
 from pathlib import Path
 from datetime import datetime
 import psycopg2
+import psycopg2.pool
 from psycopg2.extras import execute_values
 
 BASE_DIR = Path(__file__).parent.parent
@@ -19,9 +22,45 @@ DB_DIR.mkdir(exist_ok=True)
 LOCAL_DB = DB_DIR / "robot_telemetry.db"
 SYNC_STATUS_FILE = DB_DIR / "sync_status.json"
 
+_local = threading.local()
+_init_lock = threading.Lock()
+_local_db_initialized = False
+
+# Shared pool of cloud DB connections, created on first use
+CLOUD_POOL_MIN = 1
+CLOUD_POOL_MAX = 8
+CLOUD_POOL_IDLE_PROBE = 60  # seconds idle before a pooled connection is probed on checkout
+_cloud_pool = None
+_cloud_pool_lock = threading.Lock()
+# Checkouts wait here for a free connection instead of getting PoolError from a full pool
+_cloud_pool_slots = threading.BoundedSemaphore(CLOUD_POOL_MAX)
+# Last release time of each pooled connection, keyed by id(conn)
+_cloud_conn_last_used = {}
+
+def get_local_connection():
+    """Get this thread's reusable connection to the local SQLite database"""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(LOCAL_DB, check_same_thread=False)
+        # Per-connection settings (journal_mode=WAL is persisted by init_local_db)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA mmap_size=268435456')
+        _local.conn = conn
+    return conn
+
 def init_local_db():
-    """Initialize local SQLite database"""
-    conn = sqlite3.connect(LOCAL_DB)
+    """Initialize local SQLite database (runs once per process)"""
+    global _local_db_initialized
+    with _init_lock:
+        if _local_db_initialized:
+            return
+        _create_local_schema()
+        _local_db_initialized = True
+
+def _create_local_schema():
+    conn = get_local_connection()
+    conn.execute('PRAGMA journal_mode=WAL')
     c = conn.cursor()
     c.execute('''
         CREATE TABLE IF NOT EXISTS sensor_data (
@@ -40,32 +79,46 @@ def init_local_db():
     c.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON sensor_data(timestamp)')
     c.execute('CREATE INDEX IF NOT EXISTS idx_synced ON sensor_data(synced)')
     conn.commit()
-    conn.close()
 
 def save_to_local_db(timestamp, ultrasonic=None, ir_left=None, ir_center=None, ir_right=None, line_state=None):
     """Save sensor data to local SQLite database"""
     try:
-        conn = sqlite3.connect(LOCAL_DB)
-        c = conn.cursor()
-        c.execute('''
-            INSERT INTO sensor_data (timestamp, ultrasonic_cm, ir_left, ir_center, ir_right, line_state, synced)
-            VALUES (?, ?, ?, ?, ?, ?, 0)
-        ''', (timestamp, ultrasonic, ir_left, ir_center, ir_right, line_state))
-        conn.commit()
-        conn.close()
+        conn = get_local_connection()
+        with conn:
+            conn.execute('''
+                INSERT INTO sensor_data (timestamp, ultrasonic_cm, ir_left, ir_center, ir_right, line_state, synced)
+                VALUES (?, ?, ?, ?, ?, ?, 0)
+            ''', (timestamp, ultrasonic, ir_left, ir_center, ir_right, line_state))
         return True
     except Exception as e:
         print(f"Error saving to local DB: {e}")
         return False
 
+def save_batch_to_local_db(rows):
+    """Save many sensor rows to local SQLite database in one transaction
+    Each row is (timestamp, ultrasonic, ir_left, ir_center, ir_right, line_state)
+    """
+    if not rows:
+        return True
+    try:
+        conn = get_local_connection()
+        with conn:
+            conn.executemany('''
+                INSERT INTO sensor_data (timestamp, ultrasonic_cm, ir_left, ir_center, ir_right, line_state, synced)
+                VALUES (?, ?, ?, ?, ?, ?, 0)
+            ''', rows)
+        return True
+    except Exception as e:
+        print(f"Error saving batch to local DB: {e}")
+        return False
+
 def get_unsynced_records():
     """Get all unsynced records from local database"""
     try:
-        conn = sqlite3.connect(LOCAL_DB)
+        conn = get_local_connection()
         c = conn.cursor()
         c.execute('SELECT id, timestamp, ultrasonic_cm, ir_left, ir_center, ir_right, line_state FROM sensor_data WHERE synced = 0 ORDER BY id')
         records = c.fetchall()
-        conn.close()
         return records
     except Exception as e:
         print(f"Error getting unsynced records: {e}")
@@ -74,48 +127,108 @@ def get_unsynced_records():
 def mark_as_synced(record_ids):
     """Mark records as synced"""
     try:
-        conn = sqlite3.connect(LOCAL_DB)
-        c = conn.cursor()
+        conn = get_local_connection()
         sync_time = datetime.now().isoformat()
         placeholders = ','.join('?' * len(record_ids))
-        c.execute(f'UPDATE sensor_data SET synced = 1, sync_timestamp = ? WHERE id IN ({placeholders})', 
-                 [sync_time] + list(record_ids))
-        conn.commit()
-        conn.close()
+        with conn:
+            conn.execute(f'UPDATE sensor_data SET synced = 1, sync_timestamp = ? WHERE id IN ({placeholders})', 
+                         [sync_time] + list(record_ids))
         return True
     except Exception as e:
         print(f"Error marking as synced: {e}")
         return False
 
+def _get_cloud_pool(cloud_db_url):
+    """Create the shared cloud connection pool on first use"""
+    global _cloud_pool
+    with _cloud_pool_lock:
+        if _cloud_pool is None:
+            # Parse connection string and ensure SSL is properly configured
+            # Neon.com requires SSL connections
+            # Check if sslmode is already in the URL
+            if "sslmode" not in cloud_db_url.lower():
+                # Add sslmode if not present
+                separator = "&" if "?" in cloud_db_url else "?"
+                cloud_db_url = f"{cloud_db_url}{separator}sslmode=require"
+
+            # Connect with timeout
+            # Note: sslmode in connection string takes precedence over parameter
+            _cloud_pool = psycopg2.pool.ThreadedConnectionPool(
+                CLOUD_POOL_MIN,
+                CLOUD_POOL_MAX,
+                cloud_db_url,
+                connect_timeout=10,
+                # TCP keepalives so dead connections are noticed instead of hanging
+                keepalives=1,
+                keepalives_idle=30,
+                keepalives_interval=10,
+                keepalives_count=3
+            )
+            atexit.register(_cloud_pool.closeall)
+        return _cloud_pool
+
+def _checkout_cloud_connection(pool):
+    """Get a pooled connection that is known to work
+    psycopg2 only marks a connection closed after an operation fails, so
+    connections idle longer than CLOUD_POOL_IDLE_PROBE (which the server may
+    have dropped, e.g. Neon compute suspended) are probed with SELECT 1 and
+    replaced. Recently used ones are trusted to save the round trips.
+    """
+    for attempt in range(CLOUD_POOL_MAX + 1):
+        conn = pool.getconn()
+        last_used = _cloud_conn_last_used.get(id(conn))
+        if last_used is not None and time.time() - last_used < CLOUD_POOL_IDLE_PROBE:
+            return conn
+        try:
+            c = conn.cursor()
+            c.execute('SELECT 1')
+            c.close()
+            conn.rollback()
+            return conn
+        except psycopg2.Error:
+            _cloud_conn_last_used.pop(id(conn), None)
+            pool.putconn(conn, close=True)
+            if attempt == CLOUD_POOL_MAX:
+                raise
+
 def get_cloud_connection():
-    """Get connection to cloud database with proper error handling"""
+    """Get connection to cloud database from the shared pool with proper error handling
+    Waits for a free connection when all CLOUD_POOL_MAX are checked out.
+    Return it with release_cloud_connection() instead of closing it
+    """
     cloud_db_url = os.environ.get("DATABASE_URL", "")
     if not cloud_db_url:
         return None, "No DATABASE_URL set"
     
+    _cloud_pool_slots.acquire()
     try:
-        # Parse connection string and ensure SSL is properly configured
-        # Neon.com requires SSL connections
-        # Check if sslmode is already in the URL
-        if "sslmode" not in cloud_db_url.lower():
-            # Add sslmode if not present
-            separator = "&" if "?" in cloud_db_url else "?"
-            cloud_db_url = f"{cloud_db_url}{separator}sslmode=require"
-        
-        # Connect with timeout
-        # Note: sslmode in connection string takes precedence over parameter
-        conn = psycopg2.connect(
-            cloud_db_url,
-            connect_timeout=10
-        )
-        return conn, None
+        pool = _get_cloud_pool(cloud_db_url)
+        return _checkout_cloud_connection(pool), None
     except psycopg2.OperationalError as e:
+        _cloud_pool_slots.release()
         return None, f"Connection error: {e}"
     except psycopg2.Error as e:
+        _cloud_pool_slots.release()
         return None, f"Database error: {e}"
     except Exception as e:
+        _cloud_pool_slots.release()
         return None, f"Unexpected error: {e}"
 
+def release_cloud_connection(conn, close=False):
+    """Return a connection to the shared pool (close=True discards it after an error)"""
+    try:
+        _cloud_pool.putconn(conn, close=close)
+        # The pool closes connections it does not keep; only track the ones it kept
+        if conn.closed:
+            _cloud_conn_last_used.pop(id(conn), None)
+        else:
+            _cloud_conn_last_used[id(conn)] = time.time()
+    except Exception as e:
+        print(f"Error releasing cloud connection: {e}", file=sys.stderr)
+    finally:
+        # After putconn so a waiting checkout never sees the pool still full
+        _cloud_pool_slots.release()
+
 def sync_to_cloud():
     """Sync unsynced records to cloud database (Neon.com)"""
     cloud_db_url = os.environ.get("DATABASE_URL", "")
@@ -205,7 +318,7 @@ def sync_to_cloud():
                 continue
         
         if not records:
-            conn.close()
+            release_cloud_connection(conn)
             return True
         
         # Use ON CONFLICT - try constraint name first, then column list
@@ -242,7 +355,7 @@ def sync_to_cloud():
                 import traceback
                 print(f"[sync] Traceback: {traceback.format_exc()}", file=sys.stderr)
                 conn.rollback()
-                conn.close()
+                release_cloud_connection(conn)
                 return False
         
         conn.commit()
@@ -254,7 +367,7 @@ def sync_to_cloud():
             mark_as_synced(record_ids)
             print(f"[sync] Marked {len(record_ids)} records as synced", file=sys.stderr)
         
-        conn.close()
+        release_cloud_connection(conn)
         
         print(f"[sync] Successfully synced {len(records)} records to cloud (inserted: {inserted_count}, duplicates skipped: {len(records) - inserted_count}) at {datetime.now().strftime('%H:%M:%S')}", file=sys.stderr)
         return True
@@ -262,9 +375,9 @@ def sync_to_cloud():
         print(f"Error syncing to cloud: {e}")
         try:
             conn.rollback()
-            conn.close()
         except:
             pass
+        release_cloud_connection(conn, close=True)
         return False
 
 def check_internet():